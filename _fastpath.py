@@ -0,0 +1,80 @@
+# _fastpath.py
+"""Per-request hot paths for app.py, kept free of FastAPI types.
+
+Everything here is fully annotated so the module can be compiled with
+mypyc (`mypyc --ignore-missing-imports _fastpath.py`); the resulting
+extension module shadows this file on import. Without it the module runs
+as plain Python.
+"""
+
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from google.analytics.data_v1beta import FilterExpression, Filter
+
+
+def build_dimension_filter(
+    df: Optional[Dict[str, Any]],
+) -> Optional[FilterExpression]:
+    """Supports a simple equality filter for eventName."""
+    if not df:
+        return None
+    if "eventName" in df and df["eventName"]:
+        return FilterExpression(
+            filter=Filter(
+                field_name="eventName",
+                string_filter=Filter.StringFilter(
+                    value=df["eventName"],
+                    match_type=Filter.StringFilter.MatchType.EXACT,
+                ),
+            )
+        )
+    return None
+
+
+@lru_cache(maxsize=256)
+def row_factory(
+    dim_names: Tuple[str, ...], metric_names: Tuple[str, ...]
+) -> Callable[[Any, Any], Dict[str, str]]:
+    """Returns a function that builds one row dict for this report shape.
+
+    The function is generated source along the lines of
+    `def make_row(d, m): return {"date": d[0].value, "activeUsers": m[0].value}`
+    so each row is a single dict display with no zip or per-value lookups.
+    Names are embedded with repr(), which always yields a valid literal.
+    """
+    # DimensionValue and MetricValue both carry their string in `value`.
+    items = [f"{name!r}: d[{i}].value" for i, name in enumerate(dim_names)]
+    items += [f"{name!r}: m[{i}].value" for i, name in enumerate(metric_names)]
+    src = "def make_row(d, m):\n    return {" + ", ".join(items) + "}\n"
+    namespace: Dict[str, Any] = {}
+    exec(src, namespace)
+    return namespace["make_row"]
+
+
+def flatten_rows(
+    dim_names: Tuple[str, ...],
+    metric_names: Tuple[str, ...],
+    rows: Iterable[Any],
+) -> Iterator[Dict[str, str]]:
+    """Yields each raw protobuf report row as a {header: value} dict."""
+    make_row = row_factory(dim_names, metric_names)
+    for r in rows:
+        yield make_row(r.dimension_values, r.metric_values)
+
+
+def row_values(rows: Iterable[Any]) -> Iterator[List[str]]:
+    """Yields each raw protobuf report row as a list of its values."""
+    for r in rows:
+        yield [v.value for v in r.dimension_values] + [
+            m.value for m in r.metric_values
+        ]
@@ -1,181 +1,521 @@
 # app.py
+import asyncio
+import hashlib
+import hmac
+import logging
 import os
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
 
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+import orjson
+from cachetools import TTLCache
+from grpc import aio
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from google.analytics.data_v1beta import (
-    BetaAnalyticsDataClient,
+    BetaAnalyticsDataAsyncClient,
     RunReportRequest,
+    RunReportResponse,
     DateRange,
     Metric,
     Dimension,
-    FilterExpression,
-    Filter,
 )
+from google.analytics.data_v1beta.services.beta_analytics_data.transports import (
+    BetaAnalyticsDataGrpcAsyncIOTransport,
+)
+
+from _fastpath import build_dimension_filter, flatten_rows, row_values
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson instead of the stdlib encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Open the GA4 channel (DNS, TLS, HTTP/2) before the first request needs
+    # it. Failures are non-fatal: get_client() retries lazily per request.
+    try:
+        channel = get_client().transport.grpc_channel
+        await asyncio.wait_for(channel.channel_ready(), timeout=10)
+    except Exception as e:
+        logger.warning("GA4 channel warm-up failed: %s", e)
+    yield
+
 
 AUTH_TOKEN = os.environ.get("MCP_AUTH_TOKEN")
-app = FastAPI(title="GA4 MCP HTTP Server", version="1.2.0")
+_AUTH_TOKEN_B = AUTH_TOKEN.encode() if AUTH_TOKEN else None
+_VALID_TOKENS: TTLCache = TTLCache(maxsize=1024, ttl=300)
+app = FastAPI(
+    title="GA4 MCP HTTP Server",
+    version="1.2.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
+
+# One client per process so the gRPC channel and ADC token are reused.
+_GA_CLIENT: Optional[BetaAnalyticsDataAsyncClient] = None
+
+# Ping the long-lived channel's HTTP/2 connection every 5 minutes, even
+# while no call is in flight, so idle gaps between bursts don't let it be
+# dropped and re-handshaken. Google frontends close connections that ping
+# more often than that with GOAWAY "too_many_pings", so don't lower it.
+_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 5 * 60 * 1000),
+    ("grpc.keepalive_timeout_ms", 20 * 1000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+# Report responses keyed by a digest of the serialized RunReportRequest.
+# Ranges ending recently (or given relatively, e.g. "today") can still
+# change, so they expire sooner than settled historical ranges.
+# Both caches are bounded by the responses' serialized size (32 MiB in
+# total) since callers choose the row count through `limit`; reports over
+# _MAX_CACHED_REPORT_BYTES are never cached so one can't flush the rest.
+_MAX_CACHED_REPORT_BYTES = 4 * 1024 * 1024
+
+
+def _report_size(resp: RunReportResponse) -> int:
+    return RunReportResponse.pb(resp).ByteSize()
+
+
+_RECENT_REPORTS: TTLCache = TTLCache(
+    maxsize=8 * 1024 * 1024, ttl=60, getsizeof=_report_size
+)
+_HISTORICAL_REPORTS: TTLCache = TTLCache(
+    maxsize=24 * 1024 * 1024, ttl=3600, getsizeof=_report_size
+)
+
+
+# ─────────────── Request models ───────────────
+class NamedField(BaseModel):
+    name: str
+
+
+class DateRangeIn(BaseModel):
+    startDate: str
+    endDate: str
+
+
+class RunReportArgs(BaseModel):
+    property: str  # "properties/<NUMERIC_ID>"
+    metrics: List[NamedField]
+    dateRanges: List[DateRangeIn]
+    dimensions: List[NamedField] = []
+    limit: int = 1000
+    dimensionFilter: Optional[Dict[str, Any]] = None
+    format: Literal["rows", "columnar"] = "rows"
+
+
+class CallBody(BaseModel):
+    toolName: Optional[str] = None
+    arguments: RunReportArgs
+
+
+def describe_validation_error(e: ValidationError) -> str:
+    """Summarizes the first error as call_tool's JSON-RPC error message."""
+    err = e.errors()[0]
+    field = ".".join(str(p) for p in err["loc"])
+    if err["type"] == "missing":
+        return f"Missing required field: {field}"
+    return f"Invalid field {field}: {err['msg']}"
 
 
 # ─────────────────────────── Auth ───────────────────────────
-def require_bearer(request: Request) -> None:
-    if not AUTH_TOKEN:
-        raise HTTPException(status_code=500, detail="Server missing MCP_AUTH_TOKEN")
-    header = request.headers.get("authorization", "")
-    if not header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing bearer token")
-    token = header.split(" ", 1)[1].strip()
-    if token != AUTH_TOKEN:
-        raise HTTPException(status_code=401, detail="Invalid token")
+class BearerAuthMiddleware:
+    """Rejects HTTP requests without the shared bearer token before routing.
 
+    Works on the raw ASGI header list, so no Request/Headers objects are
+    built for the check.
+    """
 
-# ─────────────── GA4 helpers (shared) ───────────────
-def build_dimension_filter(args: Dict[str, Any]) -> Optional[FilterExpression]:
-    """Supports a simple equality filter for eventName."""
-    df = args.get("dimensionFilter")
-    if not df:
+    # Health check and FastAPI's docs stay reachable without a token.
+    PUBLIC_PATHS = frozenset(
+        {"/", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"}
+    )
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        if scope["type"] == "http" and not (
+            scope["method"] in ("GET", "HEAD")
+            and scope["path"] in self.PUBLIC_PATHS
+        ):
+            error = self._check(scope["headers"])
+            if error is not None:
+                status_code, detail = error
+                response = ORJSONResponse(
+                    {"detail": detail}, status_code=status_code
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _check(headers: List[Tuple[bytes, bytes]]) -> Optional[Tuple[int, str]]:
+        """Returns (status, detail) for a rejected request, else None."""
+        if not _AUTH_TOKEN_B:
+            return 500, "Server missing MCP_AUTH_TOKEN"
+        header = next((v for k, v in headers if k == b"authorization"), None)
+        if not header or not header.startswith(b"Bearer "):
+            return 401, "Missing bearer token"
+        token = header[7:].strip()
+        # MCP clients reuse one token, so remember recent successful checks.
+        # Keyed by digest so raw tokens are never held in memory.
+        digest = hashlib.sha256(token).digest()
+        if digest in _VALID_TOKENS:
+            return None
+        if not hmac.compare_digest(token, _AUTH_TOKEN_B):
+            return 401, "Invalid token"
+        _VALID_TOKENS[digest] = True
         return None
-    if "eventName" in df and df["eventName"]:
-        return FilterExpression(
-            filter=Filter(
-                field_name="eventName",
-                string_filter=Filter.StringFilter(
-                    value=df["eventName"],
-                    match_type=Filter.StringFilter.MatchType.EXACT,
-                ),
+
+
+app.add_middleware(BearerAuthMiddleware)
+# Report rows repeat every column name, so JSON bodies compress very well.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
+# ─────────────── GA4 helpers (shared) ───────────────
+def get_client() -> BetaAnalyticsDataAsyncClient:
+    """Returns the process-wide Data API async client, creating it on first use.
+
+    Must be called from the event loop: the underlying grpc.aio channel binds
+    to the running loop. No lock is needed since there is no await between
+    the check and the assignment.
+    """
+    global _GA_CLIENT
+    if _GA_CLIENT is None:
+        # ADC via Cloud Run service account
+        _GA_CLIENT = BetaAnalyticsDataAsyncClient(
+            transport=BetaAnalyticsDataGrpcAsyncIOTransport(
+                channel=_create_channel
             )
         )
-    return None
+    return _GA_CLIENT
 
 
-def run_ga4_report(args: Dict[str, Any]) -> Dict[str, Any]:
-    # Required
-    prop = args["property"]  # "properties/<NUMERIC_ID>"
-    metrics_in = [Metric(name=m["name"]) for m in args["metrics"]]
+def _create_channel(*args: Any, **kwargs: Any) -> aio.Channel:
+    """Creates the transport's default channel plus the keepalive options."""
+    kwargs["options"] = [*kwargs.get("options", ()), *_CHANNEL_OPTIONS]
+    return BetaAnalyticsDataGrpcAsyncIOTransport.create_channel(*args, **kwargs)
+
+
+def _report_cache(date_ranges: List[DateRange]) -> TTLCache:
+    """Returns the report cache whose TTL suits the requested date ranges."""
+    # GA4 keeps processing data for up to ~2 days after it is collected.
+    settled = date.today() - timedelta(days=2)
+    for r in date_ranges:
+        try:
+            end = date.fromisoformat(r.end_date)
+        except ValueError:  # "today", "yesterday", "NdaysAgo"
+            return _RECENT_REPORTS
+        if end > settled:
+            return _RECENT_REPORTS
+    return _HISTORICAL_REPORTS
+
+
+async def fetch_ga4_report(args: RunReportArgs) -> RunReportResponse:
+    metrics_in = [Metric(name=m.name) for m in args.metrics]
     date_ranges_in = [
-        DateRange(start_date=r["startDate"], end_date=r["endDate"])
-        for r in args["dateRanges"]
+        DateRange(start_date=r.startDate, end_date=r.endDate)
+        for r in args.dateRanges
     ]
-    # Optional
-    dims_in = [Dimension(name=d["name"]) for d in args.get("dimensions", [])]
-    limit = int(args.get("limit", 1000))
-    dim_filter = build_dimension_filter(args)
+    dims_in = [Dimension(name=d.name) for d in args.dimensions]
+    dim_filter = build_dimension_filter(args.dimensionFilter)
 
-    client = BetaAnalyticsDataClient()  # ADC via Cloud Run service account
+    client = get_client()
     req = RunReportRequest(
-        property=prop,
+        property=args.property,
         metrics=metrics_in,
         dimensions=dims_in,
         date_ranges=date_ranges_in,
-        limit=limit,
+        limit=args.limit,
         dimension_filter=dim_filter,
     )
-    resp = client.run_report(req)
+    key = hashlib.blake2b(RunReportRequest.serialize(req)).digest()
+    cache = _report_cache(date_ranges_in)
+    resp = cache.get(key)
+    if resp is None:
+        resp = await client.run_report(req)
+        if _report_size(resp) <= _MAX_CACHED_REPORT_BYTES:
+            cache[key] = resp
+    return resp
+
 
-    headers = [h.name for h in resp.dimension_headers] + [
+def report_columns(resp: RunReportResponse) -> List[str]:
+    """Returns the dimension then metric names, in row value order."""
+    return [h.name for h in resp.dimension_headers] + [
         h.name for h in resp.metric_headers
     ]
-    rows: List[Dict[str, Any]] = []
-    for r in resp.rows:
-        vals = [v.string_value for v in r.dimension_values] + [
-            m.value for m in r.metric_values
-        ]
-        rows.append({k: v for k, v in zip(headers, vals)})
 
+
+def iter_report_rows(
+    resp: RunReportResponse, fmt: str = "rows"
+) -> Iterator[Any]:
+    """Yields each report row as a {header: value} dict.
+
+    With fmt="columnar", rows are plain value lists ordered like
+    report_columns(resp) instead.
+    """
+    # Walk the raw protobuf message: field access stays in the C runtime
+    # instead of going through proto-plus marshalling for every value.
+    pb = RunReportResponse.pb(resp)
+    if fmt == "columnar":
+        return row_values(pb.rows)
+    return flatten_rows(
+        tuple(h.name for h in pb.dimension_headers),
+        tuple(h.name for h in pb.metric_headers),
+        pb.rows,
+    )
+
+
+async def run_ga4_report(args: RunReportArgs) -> Dict[str, Any]:
+    resp = await fetch_ga4_report(args)
+    rows = list(iter_report_rows(resp, args.format))
+    if args.format == "columnar":
+        return {
+            "ok": True,
+            "rowCount": len(rows),
+            "columns": report_columns(resp),
+            "data": rows,
+        }
     return {"ok": True, "rowCount": len(rows), "rows": rows}
 
 
-# ─────────────── Health ───────────────
-@app.get("/")
-async def root():
-    return {"status": "ok", "service": "ga4-mcp-http"}
+# Streamed rows are sent in chunks of about this size, so each ASGI send
+# (and gzip flush) carries many rows instead of one.
+_STREAM_CHUNK_BYTES = 64 * 1024
 
 
-# ───────── Legacy endpoints (curl-friendly) ─────────
-@app.get("/tools")
-async def legacy_tools(request: Request):
-    require_bearer(request)
-    return {
-        "tools": [
-            {
-                "name": "run_report",
-                "description": "Run a GA4 Core (Data API) report.",
-                "input_schema": {
-                    "type": "object",
-                    "required": ["property", "metrics", "dateRanges"],
-                    "properties": {
-                        "property": {
-                            "type": "string",
-                            "description": "GA4 property resource: 'properties/<NUMERIC_ID>'",
-                            "example": "properties/123456789",
-                        },
-                        "metrics": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {"name": {"type": "string"}},
-                            },
-                            "example": [{"name": "activeUsers"}],
-                        },
-                        "dimensions": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {"name": {"type": "string"}},
+async def stream_ga4_report(
+    resp: RunReportResponse, fmt: str = "rows"
+) -> AsyncIterator[bytes]:
+    """Yields an NDJSON summary line, then the row lines in ~64 KB chunks.
+
+    This is an async generator so StreamingResponse iterates it on the event
+    loop; a sync one would be moved to a worker thread chunk by chunk.
+    """
+    summary: Dict[str, Any] = {"ok": True, "rowCount": len(resp.rows)}
+    if fmt == "columnar":
+        summary["columns"] = report_columns(resp)
+    yield orjson.dumps(summary) + b"\n"
+    chunk = bytearray()
+    for row in iter_report_rows(resp, fmt):
+        chunk += orjson.dumps(row)
+        chunk += b"\n"
+        if len(chunk) >= _STREAM_CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+# ─────────────── Tool schema ───────────────
+# Static, so it is serialized once at import and served verbatim.
+_TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "run_report",
+        "description": "Run a GA4 Core (Data API) report.",
+        "input_schema": {
+            "type": "object",
+            "required": ["property", "metrics", "dateRanges"],
+            "properties": {
+                "property": {
+                    "type": "string",
+                    "description": "GA4 property resource: 'properties/<NUMERIC_ID>'",
+                    "example": "properties/123456789",
+                },
+                "metrics": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"name": {"type": "string"}},
+                    },
+                    "example": [{"name": "activeUsers"}],
+                },
+                "dimensions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"name": {"type": "string"}},
+                    },
+                    "example": [{"name": "date"}],
+                },
+                "dateRanges": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "startDate": {
+                                "type": "string",
+                                "example": "7daysAgo",
                             },
-                            "example": [{"name": "date"}],
-                        },
-                        "dateRanges": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "startDate": {"type": "string", "example": "7daysAgo"},
-                                    "endDate": {"type": "string", "example": "yesterday"},
-                                },
-                                "required": ["startDate", "endDate"],
+                            "endDate": {
+                                "type": "string",
+                                "example": "yesterday",
                             },
-                            "example": [{"startDate": "7daysAgo", "endDate": "yesterday"}],
-                        },
-                        "limit": {"type": "integer", "default": 1000},
-                        "dimensionFilter": {
-                            "type": "object",
-                            "description": 'Optional simple filter. Example: {"eventName":"purchase"}',
-                            "example": {"eventName": "purchase"},
                         },
+                        "required": ["startDate", "endDate"],
                     },
+                    "example": [
+                        {"startDate": "7daysAgo", "endDate": "yesterday"}
+                    ],
                 },
-            }
-        ]
+                "limit": {"type": "integer", "default": 1000},
+                "dimensionFilter": {
+                    "type": "object",
+                    "description": 'Optional simple filter. Example: {"eventName":"purchase"}',
+                    "example": {"eventName": "purchase"},
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["rows", "columnar"],
+                    "default": "rows",
+                    "description": "'rows' returns one {column: value} object per row; 'columnar' returns 'columns' plus 'data' as value arrays",
+                },
+            },
+        },
     }
+]
+_TOOLS_JSON = orjson.dumps({"tools": _TOOLS})
+
+
+# ─────────────── Health ───────────────
+@app.get("/")
+async def root():
+    return {"status": "ok", "service": "ga4-mcp-http"}
+
+
+# ───────── Legacy endpoints (curl-friendly) ─────────
+@app.get("/tools")
+async def legacy_tools():
+    return Response(_TOOLS_JSON, media_type="application/json")
 
 
 @app.post("/call")
-async def legacy_call(request: Request):
-    require_bearer(request)
-    body = await request.json()
-    tool = body.get("toolName")
-    if tool != "run_report":
-        raise HTTPException(status_code=400, detail=f"Unknown tool: {tool}")
-    args = body.get("arguments", {})
+async def legacy_call(body: CallBody, request: Request):
+    if body.toolName != "run_report":
+        raise HTTPException(
+            status_code=400, detail=f"Unknown tool: {body.toolName}"
+        )
     try:
-        result = run_ga4_report(args)
-        return JSONResponse(result)
-    except KeyError as e:
-        raise HTTPException(status_code=400, detail=f"Missing required field: {e.args[0]}")
+        # Clients that accept NDJSON get rows streamed as they are encoded.
+        if "application/x-ndjson" in request.headers.get("accept", ""):
+            resp = await fetch_ga4_report(body.arguments)
+            return StreamingResponse(
+                stream_ga4_report(resp, body.arguments.format),
+                media_type="application/x-ndjson",
+            )
+        result = await run_ga4_report(body.arguments)
+        return ORJSONResponse(result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 # ─────────────── MCP HTTP transport (POST /) ───────────────
-# Supports: initialize, ping, tools/list, tools/call
+# GA4 allows 10 concurrent requests per property, so larger batches would
+# only queue up or trip quota errors.
+MAX_BATCH_CALLS = 10
+
+
+class ToolCallError(Exception):
+    """A failed tools/call, carrying its JSON-RPC error member."""
+
+    def __init__(self, message: str, code: int = 400) -> None:
+        super().__init__(message)
+        self.error = {"code": code, "message": message}
+
+
+async def call_tool(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one tools/call and returns the tool's data."""
+    name = params.get("name")
+    if name != "run_report":
+        raise ToolCallError(f"Unknown tool: {name}")
+    try:
+        args = RunReportArgs.model_validate(params.get("arguments") or {})
+        return await run_ga4_report(args)
+    except ValidationError as e:
+        raise ToolCallError(describe_validation_error(e))
+    except Exception as e:
+        raise ToolCallError(str(e))
+
+
+def encode_tool_result(head: bytes, data: Dict[str, Any]) -> bytes:
+    """Completes the JSON-RPC envelope opened by `head` with a tool result.
+
+    `data` is encoded once and spliced into
+    `"result":{"content":[{"type":"json","data":...}]}` instead of nesting
+    it in dicts for a second encoding pass.
+    """
+    return (
+        head
+        + b',"result":{"content":[{"type":"json","data":'
+        + orjson.dumps(data)
+        + b"}]}}"
+    )
+
+
+async def stream_tool_batch(
+    req_id: Any, calls: List[Any]
+) -> AsyncIterator[bytes]:
+    """Yields one NDJSON line per call, in completion order.
+
+    Each line carries the batch `id`, the call's `index` in `calls` and its
+    own "result" or "error" member.
+    """
+    id_json = orjson.dumps(req_id)
+
+    async def run(index: int, call: Any) -> bytes:
+        try:
+            data = await call_tool(call if isinstance(call, dict) else {})
+        except ToolCallError as e:
+            return orjson.dumps(
+                {"id": req_id, "index": index, "error": e.error}
+            )
+        return encode_tool_result(
+            b'{"id":' + id_json + b',"index":' + str(index).encode(), data
+        )
+
+    tasks = [asyncio.ensure_future(run(i, c)) for i, c in enumerate(calls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done + b"\n"
+    finally:
+        # The client may disconnect mid-stream; don't leave RPCs running.
+        for task in tasks:
+            task.cancel()
+
+
+# Supports: initialize, ping, tools/list, tools/call, tools/batch
 @app.post("/")
 async def mcp_http(request: Request):
-    require_bearer(request)
     try:
-        payload = await request.json()
+        payload = orjson.loads(await request.body())
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
@@ -184,14 +524,17 @@ async def mcp_http(request: Request):
     params = payload.get("params", {}) or {}
 
     if not method:
-        return JSONResponse(
-            {"id": req_id, "error": {"code": 400, "message": "Missing 'method'"}},
+        return ORJSONResponse(
+            {
+                "id": req_id,
+                "error": {"code": 400, "message": "Missing 'method'"},
+            },
             status_code=400,
         )
 
     # Handshake
     if method == "initialize":
-        return JSONResponse(
+        return ORJSONResponse(
             {
                 "id": req_id,
                 "result": {
@@ -204,40 +547,67 @@ async def mcp_http(request: Request):
 
     # Keep-alive
     if method == "ping":
-        return JSONResponse({"id": req_id, "result": {}})
+        return ORJSONResponse({"id": req_id, "result": {}})
 
     # List tools
     if method == "tools/list":
-        tools = (await legacy_tools(request))["tools"]
-        return JSONResponse({"id": req_id, "result": {"tools": tools}})
+        # Splice the prebuilt schema bytes rather than re-encoding _TOOLS.
+        return Response(
+            b'{"id":'
+            + orjson.dumps(req_id)
+            + b',"result":'
+            + _TOOLS_JSON
+            + b"}",
+            media_type="application/json",
+        )
 
     # Call tool
     if method == "tools/call":
-        name = params.get("name")
-        if name != "run_report":
-            return JSONResponse(
-                {"id": req_id, "error": {"code": 400, "message": f"Unknown tool: {name}"}},
-                status_code=400,
-            )
-        args = params.get("arguments", {}) or {}
         try:
-            result = run_ga4_report(args)
-            return JSONResponse(
-                {"id": req_id, "result": {"content": [{"type": "json", "data": result}]}}
+            data = await call_tool(params)
+        except ToolCallError as e:
+            return ORJSONResponse(
+                {"id": req_id, "error": e.error}, status_code=400
             )
-        except KeyError as e:
-            return JSONResponse(
-                {"id": req_id, "error": {"code": 400, "message": f"Missing required field: {e.args[0]}"}},
+        return Response(
+            encode_tool_result(b'{"id":' + orjson.dumps(req_id), data),
+            media_type="application/json",
+        )
+
+    # Run several tool calls concurrently, streaming each as it completes
+    if method == "tools/batch":
+        calls = params.get("calls")
+        if not isinstance(calls, list) or not calls:
+            return ORJSONResponse(
+                {
+                    "id": req_id,
+                    "error": {
+                        "code": 400,
+                        "message": "'calls' must be a non-empty list",
+                    },
+                },
                 status_code=400,
             )
-        except Exception as e:
-            return JSONResponse(
-                {"id": req_id, "error": {"code": 400, "message": str(e)}},
+        if len(calls) > MAX_BATCH_CALLS:
+            return ORJSONResponse(
+                {
+                    "id": req_id,
+                    "error": {
+                        "code": 400,
+                        "message": f"At most {MAX_BATCH_CALLS} calls per batch",
+                    },
+                },
                 status_code=400,
             )
+        return StreamingResponse(
+            stream_tool_batch(req_id, calls), media_type="application/x-ndjson"
+        )
 
     # Unknown method
-    return JSONResponse(
-        {"id": req_id, "error": {"code": 400, "message": f"Unknown method: {method}"}},
+    return ORJSONResponse(
+        {
+            "id": req_id,
+            "error": {"code": 400, "message": f"Unknown method: {method}"},
+        },
         status_code=400,
     )
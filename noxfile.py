@@ -15,6 +15,7 @@
 import nox
 import os
 import pathlib
+import shutil
 
 PYTHON_VERSIONS = ["3.10", "3.11", "3.12", "3.13"]
 
@@ -35,6 +36,10 @@ FREEZE_COMMAND = ["python", "-m", "pip", "freeze"]
 TEST_DEPENDENCIES = [
     "pyfakefs>=5.0.0,<6.0",
     "coverage==6.5.0",
+    # app.py's HTTP server, which isn't part of the installed package.
+    "fastapi",
+    "orjson",
+    "cachetools",
 ]
 
 
@@ -85,3 +90,32 @@ def tests(session):
     session.run(
         *TEST_COMMAND,
     )
+
+
+@nox.session(python=PYTHON_VERSIONS)
+def mypyc(session):
+    """Compiles _fastpath.py with mypyc and runs the tests against it."""
+    session.install(".")
+    session.install(*TEST_DEPENDENCIES, "mypy")
+    try:
+        session.run("mypyc", "--ignore-missing-imports", "_fastpath.py")
+        session.run(
+            "python",
+            "-c",
+            "import _fastpath; "
+            "assert not _fastpath.__file__.endswith('.py'), _fastpath.__file__",
+        )
+        # Only these tests import _fastpath.
+        session.run(
+            "python",
+            "-m",
+            "unittest",
+            "--buffer",
+            "tests.app_test",
+            "tests.fastpath_test",
+        )
+    finally:
+        # A leftover extension would shadow later edits to _fastpath.py.
+        for built in pathlib.Path(".").glob("_fastpath.*.so"):
+            built.unlink()
+        shutil.rmtree("build", ignore_errors=True)
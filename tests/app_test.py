@@ -0,0 +1,611 @@
+# Copyright 2025 Google LLC All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the HTTP server in app.py."""
+
+import asyncio
+import inspect
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+import orjson
+from fastapi.testclient import TestClient
+from google.analytics.data_v1beta import DateRange, RunReportResponse
+from google.auth.credentials import AnonymousCredentials
+
+import app
+
+_TOKEN = "test-token"
+_AUTH = {"Authorization": f"Bearer {_TOKEN}"}
+_ARGS = {
+    "property": "properties/1",
+    "metrics": [{"name": "activeUsers"}],
+    "dimensions": [{"name": "date"}],
+    "dateRanges": [{"startDate": "2024-01-01", "endDate": "2024-01-03"}],
+}
+
+
+def _report(row_count=3):
+    """Returns a RunReportResponse with a date dimension and one metric."""
+    return RunReportResponse(
+        dimension_headers=[{"name": "date"}],
+        metric_headers=[{"name": "activeUsers"}],
+        rows=[
+            {
+                "dimension_values": [{"value": f"2024010{i}"}],
+                "metric_values": [{"value": str(i)}],
+            }
+            for i in range(row_count)
+        ],
+    )
+
+
+class FakeDataClient:
+    """Stands in for BetaAnalyticsDataAsyncClient and records requests.
+
+    `delays` maps a property to how long its reports take, in seconds.
+    """
+
+    def __init__(self, response=None, delays=None):
+        self.response = response or _report()
+        self.delays = delays or {}
+        self.requests = []
+        self.cancelled = []
+
+    async def run_report(self, request, **kwargs):
+        self.requests.append(request)
+        try:
+            await asyncio.sleep(self.delays.get(request.property, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(request.property)
+            raise
+        return self.response
+
+
+class AppTestCase(unittest.TestCase):
+    """Base class that isolates app.py's module state per test."""
+
+    def setUp(self):
+        self.fake = FakeDataClient()
+        for name, value in (
+            ("_AUTH_TOKEN_B", _TOKEN.encode()),
+            ("_GA_CLIENT", self.fake),
+        ):
+            patcher = mock.patch.object(app, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for cache in (
+            app._VALID_TOKENS,
+            app._RECENT_REPORTS,
+            app._HISTORICAL_REPORTS,
+        ):
+            cache.clear()
+            self.addCleanup(cache.clear)
+        # Not used as a context manager, so the lifespan warm-up never runs.
+        self.client = TestClient(app.app)
+
+
+class TestBearerAuthMiddleware(AppTestCase):
+    """Test cases for BearerAuthMiddleware."""
+
+    def test_public_paths_without_token(self):
+        """Tests that the health check and docs don't require a token."""
+        self.assertEqual(self.client.get("/").status_code, 200)
+        # Passes auth; FastAPI itself answers 405 as it has no HEAD routes.
+        self.assertEqual(self.client.head("/").status_code, 405)
+        self.assertEqual(self.client.get("/openapi.json").status_code, 200)
+
+    def test_missing_token(self):
+        """Tests that protected paths reject requests without a token."""
+        for response in (
+            self.client.get("/tools"),
+            self.client.post("/call", json={}),
+            self.client.post("/", json={"id": 1, "method": "ping"}),
+            self.client.get("/tools", headers={"Authorization": "Basic x"}),
+        ):
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(
+                response.json(), {"detail": "Missing bearer token"}
+            )
+
+    def test_wrong_token(self):
+        """Tests that a wrong token is rejected and not cached."""
+        response = self.client.get(
+            "/tools", headers={"Authorization": "Bearer nope"}
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {"detail": "Invalid token"})
+        self.assertEqual(len(app._VALID_TOKENS), 0)
+
+    def test_valid_token(self):
+        """Tests that a valid token reaches the handler and is cached."""
+        response = self.client.get("/tools", headers=_AUTH)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["tools"][0]["name"], "run_report")
+        self.assertEqual(len(app._VALID_TOKENS), 1)
+        # Served from the cache the second time.
+        self.assertEqual(
+            self.client.get("/tools", headers=_AUTH).status_code, 200
+        )
+
+    def test_post_to_public_path_requires_token(self):
+        """Tests that only GET/HEAD on public paths skip auth."""
+        response = self.client.post("/", json={"id": 1, "method": "ping"})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(
+            "/", json={"id": 1, "method": "ping"}, headers=_AUTH
+        )
+        self.assertEqual(response.json(), {"id": 1, "result": {}})
+
+    def test_unknown_path_is_unauthorized(self):
+        """Tests that unknown paths answer 401 rather than 404."""
+        self.assertEqual(self.client.get("/nope").status_code, 401)
+        self.assertEqual(
+            self.client.get("/nope", headers=_AUTH).status_code, 404
+        )
+
+    def test_server_missing_token(self):
+        """Tests the 500 when MCP_AUTH_TOKEN isn't configured."""
+        with mock.patch.object(app, "_AUTH_TOKEN_B", None):
+            response = self.client.get("/tools", headers=_AUTH)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(
+            response.json(), {"detail": "Server missing MCP_AUTH_TOKEN"}
+        )
+        # Public paths still work.
+        with mock.patch.object(app, "_AUTH_TOKEN_B", None):
+            self.assertEqual(self.client.get("/").status_code, 200)
+
+
+class TestReportCache(AppTestCase):
+    """Test cases for the GA4 report response cache."""
+
+    def _cache_for(self, *end_dates):
+        return app._report_cache(
+            [DateRange(start_date="2020-01-01", end_date=d) for d in end_dates]
+        )
+
+    def test_historical_ranges(self):
+        """Tests that settled absolute ranges use the 1h cache."""
+        old = (date.today() - timedelta(days=3)).isoformat()
+        self.assertIs(self._cache_for(old), app._HISTORICAL_REPORTS)
+        self.assertIs(
+            self._cache_for("2024-01-31", old), app._HISTORICAL_REPORTS
+        )
+        self.assertEqual(app._HISTORICAL_REPORTS.ttl, 3600)
+
+    def test_recent_ranges(self):
+        """Tests that relative or recent ranges use the 60s cache."""
+        recent = (date.today() - timedelta(days=1)).isoformat()
+        for end_date in ("today", "yesterday", "7daysAgo", recent):
+            self.assertIs(
+                self._cache_for(end_date), app._RECENT_REPORTS, end_date
+            )
+        self.assertIs(
+            self._cache_for("2024-01-31", "today"),
+            app._RECENT_REPORTS,
+            "Any recent range should make the whole report recent",
+        )
+        self.assertEqual(app._RECENT_REPORTS.ttl, 60)
+
+    def test_repeated_request_is_cached(self):
+        """Tests that an identical request doesn't call run_report again."""
+        body = {"toolName": "run_report", "arguments": _ARGS}
+        first = self.client.post("/call", json=body, headers=_AUTH)
+        # Key order in the arguments doesn't matter.
+        reordered = dict(reversed(list(_ARGS.items())))
+        second = self.client.post(
+            "/call",
+            json={"toolName": "run_report", "arguments": reordered},
+            headers=_AUTH,
+        )
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(len(self.fake.requests), 1)
+
+        different = dict(_ARGS, limit=5)
+        self.client.post(
+            "/call",
+            json={"toolName": "run_report", "arguments": different},
+            headers=_AUTH,
+        )
+        self.assertEqual(len(self.fake.requests), 2)
+
+    def test_cache_is_bounded_by_size(self):
+        """Tests that caches are bounded by bytes, not entry count."""
+        size = app._report_size(self.fake.response)
+        self.client.post(
+            "/call",
+            json={"toolName": "run_report", "arguments": _ARGS},
+            headers=_AUTH,
+        )
+        self.assertEqual(app._HISTORICAL_REPORTS.currsize, size)
+
+    def test_large_report_not_cached(self):
+        """Tests that reports over the per-entry limit aren't cached."""
+        body = {"toolName": "run_report", "arguments": _ARGS}
+        with mock.patch.object(app, "_MAX_CACHED_REPORT_BYTES", 10):
+            self.client.post("/call", json=body, headers=_AUTH)
+            self.client.post("/call", json=body, headers=_AUTH)
+        self.assertEqual(len(self.fake.requests), 2)
+        self.assertEqual(len(app._HISTORICAL_REPORTS), 0)
+
+
+class TestToolsBatch(AppTestCase):
+    """Test cases for the MCP tools/batch method."""
+
+    def _batch(self, calls):
+        return self.client.post(
+            "/",
+            json={"id": 7, "method": "tools/batch", "params": {"calls": calls}},
+            headers=_AUTH,
+        )
+
+    def test_lines_carry_index_and_outcome(self):
+        """Tests that each line has its call's index and result or error."""
+        response = self._batch(
+            [
+                {"name": "run_report", "arguments": _ARGS},
+                {"name": "nope"},
+                {"name": "run_report", "arguments": {"property": "p"}},
+                "not a call",
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["content-type"], "application/x-ndjson"
+        )
+        lines = {
+            line["index"]: line
+            for line in map(orjson.loads, response.text.splitlines())
+        }
+        self.assertEqual(sorted(lines), [0, 1, 2, 3])
+        self.assertTrue(all(line["id"] == 7 for line in lines.values()))
+        data = lines[0]["result"]["content"][0]["data"]
+        self.assertEqual(data["rowCount"], 3)
+        self.assertNotIn("error", lines[0])
+        self.assertEqual(
+            lines[1]["error"], {"code": 400, "message": "Unknown tool: nope"}
+        )
+        self.assertEqual(
+            lines[2]["error"]["message"], "Missing required field: metrics"
+        )
+        self.assertEqual(lines[3]["error"]["message"], "Unknown tool: None")
+
+    def test_lines_in_completion_order(self):
+        """Tests that faster calls are written before slower ones."""
+        self.fake.delays = {"properties/1": 0.2, "properties/2": 0.1}
+        response = self._batch(
+            [
+                {"name": "run_report", "arguments": _ARGS},
+                {
+                    "name": "run_report",
+                    "arguments": dict(_ARGS, property="properties/2"),
+                },
+                {
+                    "name": "run_report",
+                    "arguments": dict(_ARGS, property="properties/3"),
+                },
+            ]
+        )
+        indexes = [
+            orjson.loads(line)["index"] for line in response.text.splitlines()
+        ]
+        self.assertEqual(indexes, [2, 1, 0])
+
+    def test_invalid_calls(self):
+        """Tests the 400 for empty, non-list or oversized batches."""
+        too_many = [{"name": "run_report", "arguments": _ARGS}] * (
+            app.MAX_BATCH_CALLS + 1
+        )
+        for calls in ([], {"name": "run_report"}, None, too_many):
+            response = self._batch(calls)
+            self.assertEqual(response.status_code, 400, calls)
+            self.assertEqual(response.json()["id"], 7)
+            self.assertIn("error", response.json())
+        self.assertEqual(self.fake.requests, [])
+
+    def test_closing_stream_cancels_pending_calls(self):
+        """Tests that pending calls are cancelled if the stream is closed."""
+        self.fake.delays = {"properties/1": 0, "properties/2": 60}
+        calls = [
+            {"name": "run_report", "arguments": _ARGS},
+            {
+                "name": "run_report",
+                "arguments": dict(_ARGS, property="properties/2"),
+            },
+        ]
+
+        async def read_first_line():
+            stream = app.stream_tool_batch(7, calls)
+            first = await stream.__anext__()
+            await stream.aclose()
+            # Let the cancellation reach the pending task. Checked here, as
+            # asyncio.run() would cancel leftover tasks on exit anyway.
+            await asyncio.sleep(0)
+            return first, list(self.fake.cancelled)
+
+        first, cancelled = asyncio.run(read_first_line())
+        self.assertEqual(orjson.loads(first)["index"], 0)
+        self.assertEqual(cancelled, ["properties/2"])
+
+
+class TestNdjsonStream(AppTestCase):
+    """Test cases for streaming /call results as NDJSON."""
+
+    def _stream(self, arguments=_ARGS):
+        return self.client.post(
+            "/call",
+            json={"toolName": "run_report", "arguments": arguments},
+            headers={**_AUTH, "Accept": "application/x-ndjson"},
+        )
+
+    def test_summary_then_rows(self):
+        """Tests the summary line followed by one line per row."""
+        response = self._stream()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["content-type"], "application/x-ndjson"
+        )
+        lines = [orjson.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(lines[0], {"ok": True, "rowCount": 3})
+        self.assertEqual(
+            lines[1:],
+            [
+                {"date": "20240100", "activeUsers": "0"},
+                {"date": "20240101", "activeUsers": "1"},
+                {"date": "20240102", "activeUsers": "2"},
+            ],
+        )
+
+    def test_rows_split_across_chunks(self):
+        """Tests that chunking never splits or drops a line."""
+        self.fake.response = _report(row_count=50)
+        with mock.patch.object(app, "_STREAM_CHUNK_BYTES", 100):
+            response = self._stream()
+        lines = [orjson.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(lines[0]["rowCount"], 50)
+        self.assertEqual(
+            [row["activeUsers"] for row in lines[1:]],
+            [str(i) for i in range(50)],
+        )
+
+    def test_json_without_accept_header(self):
+        """Tests that the buffered JSON body is still the default."""
+        response = self.client.post(
+            "/call",
+            json={"toolName": "run_report", "arguments": _ARGS},
+            headers=_AUTH,
+        )
+        self.assertEqual(response.headers["content-type"], "application/json")
+        self.assertEqual(response.json()["rowCount"], 3)
+
+    def test_stream_runs_on_event_loop(self):
+        """Tests the generator is async, so it isn't run in a threadpool."""
+        self.assertTrue(inspect.isasyncgenfunction(app.stream_ga4_report))
+
+
+class TestColumnarFormat(AppTestCase):
+    """Test cases for the "columnar" run_report format."""
+
+    _COLUMNAR = {
+        "ok": True,
+        "rowCount": 3,
+        "columns": ["date", "activeUsers"],
+        "data": [["20240100", "0"], ["20240101", "1"], ["20240102", "2"]],
+    }
+
+    def test_tools_call(self):
+        """Tests columns, data and rowCount in a tools/call result."""
+        response = self.client.post(
+            "/",
+            json={
+                "id": 1,
+                "method": "tools/call",
+                "params": {
+                    "name": "run_report",
+                    "arguments": {**_ARGS, "format": "columnar"},
+                },
+            },
+            headers=_AUTH,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["result"]["content"][0]["data"], self._COLUMNAR
+        )
+
+    def test_legacy_call(self):
+        """Tests columns, data and rowCount in a /call result."""
+        response = self.client.post(
+            "/call",
+            json={
+                "toolName": "run_report",
+                "arguments": {**_ARGS, "format": "columnar"},
+            },
+            headers=_AUTH,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self._COLUMNAR)
+
+    def test_ndjson_summary_carries_columns(self):
+        """Tests that streamed columnar rows follow a summary with columns."""
+        response = self.client.post(
+            "/call",
+            json={
+                "toolName": "run_report",
+                "arguments": {**_ARGS, "format": "columnar"},
+            },
+            headers={**_AUTH, "Accept": "application/x-ndjson"},
+        )
+        lines = [orjson.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(
+            lines[0],
+            {"ok": True, "rowCount": 3, "columns": ["date", "activeUsers"]},
+        )
+        self.assertEqual(lines[1:], self._COLUMNAR["data"])
+
+    def test_unknown_format(self):
+        """Tests that an unknown format is rejected before any report runs."""
+        arguments = {**_ARGS, "format": "csv"}
+        response = self.client.post(
+            "/call",
+            json={"toolName": "run_report", "arguments": arguments},
+            headers=_AUTH,
+        )
+        self.assertEqual(response.status_code, 422)
+        response = self.client.post(
+            "/",
+            json={
+                "id": 1,
+                "method": "tools/call",
+                "params": {"name": "run_report", "arguments": arguments},
+            },
+            headers=_AUTH,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"]["code"], 400)
+        self.assertEqual(self.fake.requests, [])
+
+
+class TestCreateChannel(unittest.TestCase):
+    """Test cases for the GA4 client's channel factory."""
+
+    def test_appends_keepalive_options(self):
+        """Tests that the transport's own options are kept, then extended."""
+        transport = app.BetaAnalyticsDataGrpcAsyncIOTransport
+        with mock.patch.object(transport, "create_channel") as create_channel:
+            transport(
+                credentials=AnonymousCredentials(),
+                channel=app._create_channel,
+            )
+        options = create_channel.call_args.kwargs["options"]
+        self.assertIn(("grpc.max_send_message_length", -1), options)
+        self.assertIn(("grpc.max_receive_message_length", -1), options)
+        self.assertEqual(
+            options[-len(app._CHANNEL_OPTIONS) :], app._CHANNEL_OPTIONS
+        )
+        self.assertIn(("grpc.keepalive_permit_without_calls", 1), options)
+
+
+class TestArgumentValidation(AppTestCase):
+    """Test cases for rejecting invalid tool calls."""
+
+    def _tools_call(self, arguments):
+        return self.client.post(
+            "/",
+            json={
+                "id": 1,
+                "method": "tools/call",
+                "params": {"name": "run_report", "arguments": arguments},
+            },
+            headers=_AUTH,
+        )
+
+    def test_legacy_call_invalid_arguments(self):
+        """Tests that /call answers 422 for arguments that don't validate."""
+        response = self.client.post(
+            "/call",
+            json={
+                "toolName": "run_report",
+                "arguments": {**_ARGS, "limit": "abc"},
+            },
+            headers=_AUTH,
+        )
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.fake.requests, [])
+
+    def test_legacy_call_unknown_tool(self):
+        """Tests that /call answers 400 for an unknown toolName."""
+        response = self.client.post(
+            "/call",
+            json={"toolName": "run_query", "arguments": _ARGS},
+            headers=_AUTH,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "Unknown tool: run_query"})
+        self.assertEqual(self.fake.requests, [])
+
+    def test_missing_field(self):
+        """Tests the message for a missing required argument."""
+        arguments = {k: v for k, v in _ARGS.items() if k != "property"}
+        response = self._tools_call(arguments)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["error"]["message"],
+            "Missing required field: property",
+        )
+
+    def test_invalid_field(self):
+        """Tests the message for arguments of the wrong type or value."""
+        for field, value in (("limit", "abc"), ("format", "bogus")):
+            with self.subTest(field=field):
+                response = self._tools_call({**_ARGS, field: value})
+                self.assertEqual(response.status_code, 400)
+                self.assertRegex(
+                    response.json()["error"]["message"],
+                    f"^Invalid field {field}: .+",
+                )
+        self.assertEqual(self.fake.requests, [])
+
+
+class TestJsonRpcEnvelope(AppTestCase):
+    """Test cases for the byte-spliced JSON-RPC responses."""
+
+    def _post(self, req_id, method, params=None):
+        response = self.client.post(
+            "/",
+            json={"id": req_id, "method": method, "params": params or {}},
+            headers=_AUTH,
+        )
+        self.assertEqual(response.status_code, 200)
+        return orjson.loads(response.content)
+
+    def test_tools_call_round_trip(self):
+        """Tests that the envelope parses back for awkward ids."""
+        params = {"name": "run_report", "arguments": _ARGS}
+        for req_id in ('a"b\\c', None):
+            with self.subTest(req_id=req_id):
+                self.assertEqual(
+                    self._post(req_id, "tools/call", params),
+                    {
+                        "id": req_id,
+                        "result": {
+                            "content": [
+                                {
+                                    "type": "json",
+                                    "data": {
+                                        "ok": True,
+                                        "rowCount": 3,
+                                        "rows": [
+                                            {
+                                                "date": f"2024010{i}",
+                                                "activeUsers": str(i),
+                                            }
+                                            for i in range(3)
+                                        ],
+                                    },
+                                }
+                            ]
+                        },
+                    },
+                )
+
+    def test_tools_list_splice(self):
+        """Tests that the pre-encoded tool list equals a normal encoding."""
+        for req_id in (3, 'a"b', None):
+            with self.subTest(req_id=req_id):
+                self.assertEqual(
+                    self._post(req_id, "tools/list"),
+                    {"id": req_id, "result": {"tools": app._TOOLS}},
+                )
@@ -0,0 +1,121 @@
+# Copyright 2025 Google LLC All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test cases for the _fastpath module."""
+
+import unittest
+
+from google.analytics.data_v1beta import RunReportResponse
+
+import _fastpath
+
+
+def _pb_rows(*rows):
+    """Returns raw protobuf rows for (dimension values, metric values) pairs."""
+    response = RunReportResponse(
+        rows=[
+            {
+                "dimension_values": [{"value": v} for v in dims],
+                "metric_values": [{"value": v} for v in metrics],
+            }
+            for dims, metrics in rows
+        ]
+    )
+    return RunReportResponse.pb(response).rows
+
+
+class TestRowFactory(unittest.TestCase):
+    """Test cases for row_factory and flatten_rows."""
+
+    def test_mixed_dimensions_and_metrics(self):
+        """Tests rows with several dimensions and metrics."""
+        rows = _pb_rows(
+            (["20240101", "SE"], ["10", "1.5"]),
+            (["20240102", "NO"], ["20", "2.5"]),
+        )
+        self.assertEqual(
+            list(
+                _fastpath.flatten_rows(
+                    ("date", "country"), ("activeUsers", "bounceRate"), rows
+                )
+            ),
+            [
+                {
+                    "date": "20240101",
+                    "country": "SE",
+                    "activeUsers": "10",
+                    "bounceRate": "1.5",
+                },
+                {
+                    "date": "20240102",
+                    "country": "NO",
+                    "activeUsers": "20",
+                    "bounceRate": "2.5",
+                },
+            ],
+        )
+
+    def test_no_dimensions(self):
+        """Tests reports that only have metrics."""
+        rows = _pb_rows(([], ["42"]))
+        self.assertEqual(
+            list(_fastpath.flatten_rows((), ("activeUsers",), rows)),
+            [{"activeUsers": "42"}],
+        )
+
+    def test_no_rows(self):
+        """Tests that an empty report yields no rows."""
+        self.assertEqual(
+            list(_fastpath.flatten_rows(("date",), ("activeUsers",), [])), []
+        )
+
+    def test_names_needing_escapes(self):
+        """Tests that header names are embedded as literals, not code."""
+        names = (
+            "it's",
+            'say "hi"',
+            "back\\slash",
+            "new\nline",
+            "'}; import os; {'",
+            "customEvent:campaign_id",
+        )
+        rows = _pb_rows((list("abcde"), ["1"]))
+        make_row = _fastpath.row_factory(names[:5], names[5:])
+        row = make_row(rows[0].dimension_values, rows[0].metric_values)
+        self.assertEqual(row, dict(zip(names, "abcde1")))
+
+    def test_factory_is_cached_per_shape(self):
+        """Tests that each report shape compiles its factory only once."""
+        first = _fastpath.row_factory(("date",), ("activeUsers",))
+        self.assertIs(_fastpath.row_factory(("date",), ("activeUsers",)), first)
+        self.assertIsNot(_fastpath.row_factory(("date",), ("sessions",)), first)
+
+
+class TestRowValues(unittest.TestCase):
+    """Test cases for row_values."""
+
+    def test_dimensions_then_metrics(self):
+        """Tests that each row is its dimension then metric values."""
+        rows = _pb_rows(
+            (["20240101", "SE"], ["10", "1.5"]),
+            ([], ["42"]),
+        )
+        self.assertEqual(
+            list(_fastpath.row_values(rows)),
+            [["20240101", "SE", "10", "1.5"], ["42"]],
+        )
+
+    def test_no_rows(self):
+        """Tests that an empty report yields no rows."""
+        self.assertEqual(list(_fastpath.row_values([])), [])